@@ -0,0 +1,43 @@
+function toggleCategory(id) {
+    const body    = document.getElementById(id);
+    const chevron = document.getElementById('chevron_' + id);
+    const isOpen  = body.classList.toggle('open');
+    chevron.classList.toggle('open', isOpen);
+}
+
+function showDiv(id){
+    const divs = document.querySelectorAll("#tabs_div>div");
+    divs.forEach(d=>{d.classList.remove("visible")});
+    document.getElementById(id).classList.add("visible");
+}
+
+// draw one trend chart per category from the inline chart-data JSON
+JSON.parse(document.getElementById("chart-data").textContent).forEach(chart => {
+    new Chart(document.getElementById(chart.id), {
+        type: "line",
+        data: {
+            labels: chart.labels,
+            datasets: [{
+                data: chart.history,
+                borderColor: "#e53e3e",
+                borderWidth: 1.5,
+                pointRadius: 1.5,
+                fill: false,
+                tension: 0.3
+            }]
+        },
+        options: {
+            plugins: { legend: { display: false }, tooltip: {
+                callbacks: {
+                    title: function(items) { return items[0].label; },
+                    label: function(item) { return "Max CVSS: " + item.parsed.y.toFixed(1); }
+                }
+            } },
+            scales: {
+                x: { display: false },
+                y: { display: false, min: 0, max: 10 }
+            },
+            animation: false
+        }
+    });
+});
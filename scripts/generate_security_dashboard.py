@@ -5,16 +5,47 @@
 # 3. Filter test data
 # 4. Display test data
 
-import json
 import html
+import os
 import re
 
 from test_results_database_utils import *
+from test_results_database_utils import json_loads
 
+from bisect import bisect_right
 from datetime import datetime, timezone
 from jinja2 import Environment, FileSystemLoader
 
 JSON_REPORT_PATH = 'report.json'
+DASHBOARD_PATH = 'security_dashboard.html'
+PIE_CHART_CSS_PATH = 'assets/pie_chart.css'
+
+# CVSS severity bands: below 4.0 is LOW, 4.0+ MEDIUM, 7.0+ HIGH, 9.0+ CRITICAL
+SEVERITY_THRESHOLDS = (4.0, 7.0, 9.0)
+SEVERITY_LEVELS = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+# CSS class for each severity badge
+SEVERITY_CLASSES = {
+    'CRITICAL': 'severity-critical',
+    'HIGH': 'severity-high',
+    'MEDIUM': 'severity-medium',
+    'LOW': 'severity-low',
+    'NONE': 'severity-none',
+    'UNKNOWN': 'severity-unknown',
+}
+
+# palette for the pie chart slices, one color per category
+PIE_CHART_COLORS = (
+    "crimson", "teal", "gold", "coral",
+    "darkorchid", "yellowgreen", "hotpink", "steelblue", "orange",
+    "seagreen", "mediumpurple", "tomato", "cornflowerblue", "peru",
+    "limegreen", "deeppink", "dodgerblue", "sienna", "darkturquoise",
+    "indigo", "darkorange", "cadetblue", "firebrick", "mediumseagreen",
+    "slateblue", "salmon", "olivedrab", "mediumvioletred", "yellow",
+)
+
+# characters that can't appear in a category's HTML id
+CATEGORY_ID_INVALID_CHARS = re.compile(r'[^a-zA-Z_]')
 
 summary_data : dict = {
     "failed" : 0,
@@ -32,21 +63,10 @@ pie_chart_data = {
 }
 
 def get_severity_class(severity, status="failed"):
-    colors = {
-        'CRITICAL': 'severity-critical',
-        'HIGH': 'severity-high',
-        'MEDIUM': 'severity-medium',
-        'LOW': 'severity-low',
-        'NONE': 'severity-none',
-        'UNKNOWN': 'severity-unknown',
-    }
-    
-    color = colors.get('NONE')
+    if status == "passed":
+        return SEVERITY_CLASSES['NONE']
     
-    if status != "passed":
-        color = colors.get(severity, '.severity-unknown')
-    
-    return color
+    return SEVERITY_CLASSES.get(severity, '.severity-unknown')
 
 def extract_relevant_test_data():
 
@@ -54,8 +74,8 @@ def extract_relevant_test_data():
 
     # import JSON
     try:
-        with open(JSON_REPORT_PATH, 'r') as report_file:
-            report = json.load(report_file)
+        with open(JSON_REPORT_PATH, 'rb') as report_file:
+            report = json_loads(report_file.read())
 
     except:
         print("Could not load JSON file")
@@ -78,6 +98,7 @@ def extract_relevant_test_data():
             'category':         "",
             'description':      "",
             'status':           "",
+            'status_label':     "",
             'status_class':     "",
             'cvss_score':       "",
             'severity':         "",
@@ -92,6 +113,7 @@ def extract_relevant_test_data():
         new_test["category"] = test.get("feature", "Could not find in report.")
         new_test['description'] = test.get("scenario_description", "Could not find in report.")
         new_test['status'] = test.get("outcome", "Could not find in report.")
+        new_test['status_label'] = "PASS" if new_test['status'] == "passed" else "FAIL"
         new_test['status_class'] = "status-pass" if new_test['status'] == "passed" else "status-fail"
         
         new_test['cvss_score'] = test.get("cvss_score", "Could not find in report.")
@@ -118,16 +140,10 @@ def extract_relevant_test_data():
         call_duration = test.get("call", {}).get("duration", 0)
         teardown_duration = test.get("teardown", {}).get("duration", 0)
         
-        new_test['duration'] = setup_duration + call_duration + teardown_duration
+        duration = setup_duration + call_duration + teardown_duration
         
-        # round
-        if new_test['duration'] > 60:
-            new_test['duration'] = new_test['duration'] / 60
-            new_test['duration'] = round(new_test['duration'], 2)
-            new_test['duration'] = f"{new_test['duration']}m"
-        else:
-            new_test['duration'] = round(new_test['duration'], 2)
-            new_test['duration'] = f"{new_test['duration']}s"
+        # round, in minutes once past a minute
+        new_test['duration'] = f"{round(duration / 60, 2)}m" if duration > 60 else f"{round(duration, 2)}s"
         
         # errors
         error_text = test.get('call', {}).get('longrepr', None)
@@ -160,16 +176,7 @@ def extract_relevant_test_data():
         tests.append(new_test)
 
 def get_cvss_severity(cvss_score):
-    if cvss_score >= 9.0:
-        severity = "CRITICAL"
-    elif cvss_score >= 7.0:
-        severity = "HIGH"
-    elif cvss_score >= 4.0:
-        severity = "MEDIUM"
-    else:
-        severity = "LOW"
-    
-    return severity
+    return SEVERITY_LEVELS[bisect_right(SEVERITY_THRESHOLDS, cvss_score)]
 
 def prepare_data():
     
@@ -181,13 +188,15 @@ def prepare_data():
     summary_data["duration"] = summary_data["duration"] / 60
     summary_data["duration"] = round(summary_data["duration"], 1)
     
-    # get categories
+    # get categories and their stats in one pass over the tests
+    categories_by_name = {}
     for test in tests:
-        category:str = test["category"]
-        if category not in (c["name"] for c in categories):
+        category_name:str = test["category"]
+        category = categories_by_name.get(category_name)
+        if category is None:
             
-            new_category = {
-                "name" : category,
+            category = {
+                "name" : category_name,
                 "total" : 0,
                 "passed" : 0,
                 "failed" : 0,
@@ -199,33 +208,35 @@ def prepare_data():
                 "max_severity" : "UNKNOWN",
                 "history": [],
                 "labels": [],
+                "passed_tests": [],
+                "failed_tests": [],
                 "improvement_number": 0.0,
                 "improvement_sybmol": "",
                 "improvement_arrow": "-",
                 "improvement_class": "improvement-neutral",
             }
             
-            new_category["id"] = "cat_" + re.sub(r'[^a-zA-Z_]', '_', category)
+            category["id"] = "cat_" + CATEGORY_ID_INVALID_CHARS.sub('_', category_name)
             
-            categories.append(new_category)
+            categories_by_name[category_name] = category
+            categories.append(category)
+
+        # collect stats
+        category["total"] += 1
+        
+        if test["status"] == "passed":
+            category["passed"] += 1
+            category["passed_tests"].append(test)
+        elif test["status"] == "failed":
+            category["failed"] += 1
+            category["failed_tests"].append(test)
+        
+        # cvss
+        if test["cvss_score"] > category["max_cvss"]:
+            if test["status"] == "failed":
+                category["max_cvss"] = test["cvss_score"]
 
-    # get category stats
     for category in categories:
-        for test in tests:
-            if test["category"] == category["name"]:
-                # collect stats
-                category["total"] += 1
-                
-                if test["status"] == "passed":
-                    category["passed"] += 1
-                elif test["status"] == "failed":
-                    category["failed"] += 1
-                
-                # cvss
-                if test["cvss_score"] > category["max_cvss"]:
-                    if test["status"] == "failed":
-                        category["max_cvss"] = test["cvss_score"]
-        
         category["max_severity"] = get_cvss_severity(category["max_cvss"])
         
         category["max_severity_class"] = get_severity_class(category["max_severity"])
@@ -286,16 +297,11 @@ def prepare_pie_charts():
 def display_pie_chart_css():
     # write custom css for pie chart
     
-    html_colors = [
-        "crimson", "teal", "gold", "coral",
-        "darkorchid", "yellowgreen", "hotpink", "steelblue", "orange",
-        "seagreen", "mediumpurple", "tomato", "cornflowerblue", "peru",
-        "limegreen", "deeppink", "dodgerblue", "sienna", "darkturquoise",
-        "indigo", "darkorange", "cadetblue", "firebrick", "mediumseagreen",
-        "slateblue", "salmon", "olivedrab", "mediumvioletred", "yellow",
-    ]
+    # colors are handed out from the end of the palette
+    html_colors = list(PIE_CHART_COLORS)
     
-    pie_chart_css = ":root {\n"
+    # collect css fragments and join them once at the end
+    css_parts = [":root {\n"]
     
     # failed tests
     current_percent = 0
@@ -304,7 +310,7 @@ def display_pie_chart_css():
         current_percent += category[1]
         current_percent = round(current_percent)
         current_percent = min(100.0, current_percent)
-        pie_chart_css += f"  --fail_{category_id}: {current_percent}%;\n"
+        css_parts.append(f"  --fail_{category_id}: {current_percent}%;\n")
     
     # test coverage
     # failed tests
@@ -314,11 +320,11 @@ def display_pie_chart_css():
         current_percent += category[1]
         current_percent = round(current_percent)
         current_percent = min(100.0, current_percent)
-        pie_chart_css += f"  --coverage_{category_id}: {current_percent}%;\n"
+        css_parts.append(f"  --coverage_{category_id}: {current_percent}%;\n")
     
-    pie_chart_css += """}
+    css_parts.append("""}
 .chart-container-failed-tests {
-    background: conic-gradient("""
+    background: conic-gradient(""")
     
     for i in range(0, len(pie_chart_data["failed"]["percents"])):
         
@@ -333,25 +339,25 @@ def display_pie_chart_css():
         color = pie_chart_data["category_colors"][category_id]
         
         if i == 0:
-            pie_chart_css += f"{color} 0% var(--fail_{category_id})"
+            css_parts.append(f"{color} 0% var(--fail_{category_id})")
         else:
             prev_category = pie_chart_data["failed"]["percents"][i-1]
             prev_category_id = prev_category[2]
             
-            pie_chart_css += f"{color} var(--fail_{prev_category_id}) var(--fail_{category_id})"
+            css_parts.append(f"{color} var(--fail_{prev_category_id}) var(--fail_{category_id})")
         
         if i != len(pie_chart_data["failed"]["percents"]) - 1:
-            pie_chart_css += ","
+            css_parts.append(",")
         
-        pie_chart_css += "\n"
+        css_parts.append("\n")
     
-    pie_chart_css += """
+    css_parts.append("""
     );
-}"""
+}""")
     
-    pie_chart_css += """
+    css_parts.append("""
 .chart-container-total-tests {
-    background: conic-gradient("""
+    background: conic-gradient(""")
     
     for i in range(0, len(pie_chart_data["coverage"]["percents"])):
         
@@ -364,76 +370,87 @@ def display_pie_chart_css():
         color = pie_chart_data["category_colors"][category_id]
         
         if i == 0:
-            pie_chart_css += f"{color} 0% var(--coverage_{category_id})"
+            css_parts.append(f"{color} 0% var(--coverage_{category_id})")
         else:
             prev_category = pie_chart_data["coverage"]["percents"][i-1]
             prev_category_id = prev_category[2]
             
-            pie_chart_css += f"{color} var(--coverage_{prev_category_id}) var(--coverage_{category_id})"
+            css_parts.append(f"{color} var(--coverage_{prev_category_id}) var(--coverage_{category_id})")
         
         if i != len(pie_chart_data["coverage"]["percents"]) - 1:
-            pie_chart_css += ","
+            css_parts.append(",")
         
-        pie_chart_css += "\n"
+        css_parts.append("\n")
     
-    pie_chart_css += """
+    css_parts.append("""
     );
-}"""
+}""")
 
     for key in pie_chart_data["category_colors"].keys():
         category_id = key
         color = pie_chart_data["category_colors"][category_id]
         
-        pie_chart_css += f"\n.category_color_{category_id} {{ background: {color}; }}"
+        css_parts.append(f"\n.category_color_{category_id} {{ background: {color}; }}")
     
-    with open("assets/pie_chart.css", "w") as f:
-        f.write(pie_chart_css)
+    # swapped into place like the dashboard, so the page never loads half a stylesheet
+    tmp_path = PIE_CHART_CSS_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("".join(css_parts))
+    os.replace(tmp_path, PIE_CHART_CSS_PATH)
 
 def display_test_data():
 
     display_pie_chart_css()
 
     # load template
-    env = Environment(loader = FileSystemLoader('assets/templates'))
+    env = Environment(loader = FileSystemLoader('assets/templates'), auto_reload = False)
+    # compact separators for everything emitted through |tojson
+    env.policies['json.dumps_kwargs'] = {'sort_keys': True, 'separators': (',', ':')}
     template = env.get_template('security_dashboard_template.html')
     
-    output = template.render(
+    # one entry per category trend chart, emitted as a single JSON blob
+    chart_data = [
+        {"id": f"canvas_{category['id']}", "labels": category["labels"], "history": category["history"]}
+        for category in categories
+    ]
+    
+    # render straight to a temp file instead of building the whole page in memory,
+    # then swap it in so the published page is never seen half written
+    tmp_path = DASHBOARD_PATH + ".tmp"
+    template.stream(
         summary_data = summary_data,
         tests = tests,
         current_time = current_time,
         categories = categories,
         pie_chart_data = pie_chart_data,
-    )
-        
-    # save to file
-    with open("security_dashboard.html", 'w', encoding="utf-8") as f:
-        f.write(output)
+        chart_data = chart_data,
+    ).dump(tmp_path, encoding = "utf-8")
+    os.replace(tmp_path, DASHBOARD_PATH)
 
 def database_operations():
     
     init_db()
     
-    for test in tests:
-        # save test results in database
-        save_test_result(test["name"], test["cvss_score"], test["status"])
+    # every row written by this run shares one timestamp
+    run_at = datetime.now().isoformat()
     
-    for category in categories:
-        # save max cvss of a category
-        save_category_max_cvss(category["name"], category["max_cvss"])
+    # save test results in database
+    save_test_results_bulk(((test["name"], test["cvss_score"], test["status"]) for test in tests), run_at)
     
+    # save max cvss of each category
+    save_category_max_cvss_bulk(((category["name"], category["max_cvss"]) for category in categories), run_at)
+    
+    # fetch every category's recent history and baseline in one query
+    category_trends = get_category_trends(category["name"] for category in categories)
+    
+    for category in categories:
         # prepare history data and labels
-        category_history = get_category_history(category["name"])
-        category_history_labels = []
-        
-        for i in range(0, len(category_history)):
-            category_history_labels.append(f"Run {i+1}")
+        category_history, baseline = category_trends[category["name"]]
         
         category["history"] = category_history
-        category["labels"] = category_history_labels
+        category["labels"] = [f"Run {i}" for i in range(1, len(category_history) + 1)]
         
         # improvement
-        baseline = get_category_baseline(category["name"])
-        
         if baseline is not None and category["max_cvss"] is not None:
             improvement = baseline - category["max_cvss"]
             
@@ -2,7 +2,6 @@
 # that are filled in with the correct data
 
 import os
-import re
 import json
 from gherkin.parser import Parser
 
@@ -26,7 +25,7 @@ def get_feature_file(path:str) -> str:
     
     for file in allFiles:
         # find feature file
-        if re.search("\.feature$", file):
+        if file.endswith(".feature"):
             # found feature file
             feature = file
     
@@ -43,7 +42,7 @@ def read_feature_file_as_json(path:str) -> dict:
     feature_path = os.path.join(path, feature)
     
     # read this feature file in to a dictionary
-    with open(feature_path, 'r') as f:
+    with open(feature_path, 'r', encoding='utf-8') as f:
         feature_content = f.read()
     
     parser = Parser()
@@ -56,7 +55,7 @@ def read_boilerplate() -> dict:
     
     boilerplate_path = "./assets/boilerplate.json"
     
-    with open(boilerplate_path) as json_file:
+    with open(boilerplate_path, encoding='utf-8') as json_file:
         data = json.load(json_file)
         
         return data
@@ -70,10 +69,13 @@ def generate_files(category_path:str, feature_dict:dict, boilerplate:dict):
     
     # assume the background is in the conftest
     
+    # look up the feature file once rather than listing the directory per scenario
+    feature_path = get_feature_file(category_path)
+    
     # for each scenario
     for scen in scenarios:
         # create a file
-        create_file(category_path, scen, boilerplate)
+        create_file(category_path, scen, boilerplate, feature_path)
 
 def format_name_as_variable(var:str):
     var = var.strip()
@@ -82,11 +84,9 @@ def format_name_as_variable(var:str):
     
     return var
 
-def create_file(category_path:str, scenario:dict, boilerplate:dict):
+def create_file(category_path:str, scenario:dict, boilerplate:dict, feature_path:str):
     """Creates a python file in the specified category"""
     
-    feature_path = get_feature_file(category_dir)
-    
     new_file_name : str = scenario['scenario']['name']
     new_file_name = format_name_as_variable(new_file_name)
     
@@ -141,7 +141,7 @@ def create_file(category_path:str, scenario:dict, boilerplate:dict):
     file_contents += "\n" + boilerplate['footer']
     
     # write to file
-    with open(os.path.join(category_path, new_file_name), 'w') as newfile:
+    with open(os.path.join(category_path, new_file_name), 'w', encoding='utf-8') as newfile:
         newfile.write(file_contents)
 
 if __name__ == "__main__":
@@ -1,44 +1,13 @@
-import json
+import os
 import sys
-import sqlite3
 from datetime import datetime
 
-def get_category_history_score(category,db_path, limit=20 ):
-    try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        c.execute(
-            'SELECT max_cvss FROM category_history WHERE category = ? ORDER BY run_at DESC LIMIT ?',
-            (category, limit)
-        )
-        rows = c.fetchall()
-        conn.close()
-        return [row[0] for row in reversed(rows)]
-    except Exception as e:
-        print(f'Warning: Could not get category history for {category}: {e}')
-        #return a greater cvss score than is possible so the email doesn't print the category as failing - we can't necessicarily know
-        return [11]
+from test_results_database_utils import get_category_runs, json_loads
 
-def get_category_history_date(category,db_path, limit=20 ):
-    try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        c.execute(
-            'SELECT run_at FROM category_history WHERE category = ? ORDER BY run_at ASC LIMIT ?',
-            (category, limit)
-        )
-        rows = c.fetchall()
-        conn.close()
-        return [row[0] for row in rows]
-    except Exception as e:
-        print(f'Warning: Could not get category history for {category}: {e}')
-        #return a greater cvss score than is possible so the email doesn't print the category as failing - we can't necessicarily know
-        return [11]
-    
 def parse_test_results(file_name):
     try:
-        with open(file_name, 'r') as f:
-            json_report = json.load(f)
+        with open(file_name, 'rb') as f:
+            json_report = json_loads(f.read())
     except FileNotFoundError:
         print("Error: report.json not found")
         sys.exit(1)
@@ -50,13 +19,6 @@ def parse_test_results(file_name):
         
         status = 'PASS' if test.get('outcome') == 'passed' else 'FAIL'
         
-        file_path = test_name.split('::')[0]
-        path_parts = file_path.split('/')
-        if len(path_parts) >= 2:
-            category = path_parts[-2]
-        else:
-            category = 'uncategorized'
-
         duration = test.get('call', {}).get('duration', 0)
         
         if duration == 0 or duration is None:
@@ -97,11 +59,11 @@ def main():
     #use function to extract json
     data = parse_test_results(file_name)
 
-    #prepare email 
-    email_text = """This is an automated email triggered by the automated security tests, viewed <a href = 'https://security-dashboard.openmrs.org/'>here</a>. <br> 
+    #prepare email as a list of pieces, joined once at the end
+    email_parts = ["""This is an automated email triggered by the automated security tests, viewed <a href = 'https://security-dashboard.openmrs.org/'>here</a>. <br> 
 Testing indicates several failing tests of high or critical severity, as defined by CVSS 4.0. <br>
-Please see the <a href = 'https://github.com/openmrs/openmrs-contrib-cvss-scanning'>GitHub repository's</a> tests directory for the tests themselves. <br>"""
-    email_text += "\nThe failing tests and their CVSS scores follow:<br><br>\n"
+Please see the <a href = 'https://github.com/openmrs/openmrs-contrib-cvss-scanning'>GitHub repository's</a> tests directory for the tests themselves. <br>"""]
+    email_parts.append("\nThe failing tests and their CVSS scores follow:<br><br>\n")
 
     failing_categories =[]
     failing_categories_max_cvss={}
@@ -110,17 +72,17 @@ Please see the <a href = 'https://github.com/openmrs/openmrs-contrib-cvss-scanni
     #scan failing tests for CVSS scores > 7 and the max failing test in each category
     for category in data[0]:
         if(add_br):
-            email_text += "<br>"
+            email_parts.append("<br>")
             add_br=False
         for test in data[0][category]:
             if test['cvss_score']>=7 and test['status'] == "FAIL":
                 if(category not in failing_categories):
                     failing_categories.insert(0,category)
-                    email_text+=f"\n{category}:<br>\n"
+                    email_parts.append(f"\n{category}:<br>\n")
                     add_br=True
                 test_file = test["full_name"].split("::")[0].split("/")
                 test_file = test_file[len(test_file)-1]
-                email_text+= f"<b>{test_file}</b> : {test['cvss_score']} <br>\n"
+                email_parts.append(f"<b>{test_file}</b> : {test['cvss_score']} <br>\n")
             if test['status'] == "FAIL":
                 if(category not in failing_categories_max_cvss):
                     failing_categories_max_cvss[category]= test['cvss_score']
@@ -129,18 +91,19 @@ Please see the <a href = 'https://github.com/openmrs/openmrs-contrib-cvss-scanni
 
     #scan for failing tests with cvss 9.0 or greater, save test file, cvss score
     if(len(failing_categories)==0 and len(failing_categories_max_cvss)==0):
-        email_text+="\nNO FAILING TESTS\n"
+        email_parts.append("\nNO FAILING TESTS\n")
     elif (len(failing_categories)==0):
-        email_text+= "No tests failed with a high or critical score.<br>"
+        email_parts.append("No tests failed with a high or critical score.<br>")
 
     categories_with_score_increase = {}
 
     if(len(failing_categories_max_cvss)>=1):
         #only need to run this if there are failing tests, no failing tests is good and means there aren't 
         try:
+            #get cvss history for every failing category at once
+            category_runs = get_category_runs(failing_categories_max_cvss, sys.argv[2], 1)
             for category in failing_categories_max_cvss:
-                #get cvss history for category
-                category_history = get_category_history_score(category,sys.argv[2],1)
+                category_history = [max_cvss for max_cvss, run_at in category_runs[category]]
                 #see if the test historic score is < than the max
                 max_increase = 0
                 for point in category_history:
@@ -154,14 +117,15 @@ Please see the <a href = 'https://github.com/openmrs/openmrs-contrib-cvss-scanni
             "ignore category"
 
     if(len(categories_with_score_increase) >1):
-        email_text += "\n<br>These testing categories saw their highest testing CVSS score increase: <br>\n"
+        email_parts.append("\n<br>These testing categories saw their highest testing CVSS score increase: <br>\n")
         for category in categories_with_score_increase:
-            email_text += f"<b>{category}</b>: +{categories_with_score_increase[category]}<br>\n"
+            email_parts.append(f"<b>{category}</b>: +{categories_with_score_increase[category]}<br>\n")
 
     #new categories, 
     new_categories=[]
+    category_runs = get_category_runs(data[0], sys.argv[2], 1, newest=False)
     for category in data[0]:
-        category_history = get_category_history_date(category,sys.argv[2],1)
+        category_history = [run_at for max_cvss, run_at in category_runs[category]]
         #since we are ordering by ascending, the oldest run_at is selected, and we can compare that to today's date to see if the tests are first ran within a day
         time = datetime.fromisoformat(category_history[0])
         today = datetime.today()
@@ -172,15 +136,15 @@ Please see the <a href = 'https://github.com/openmrs/openmrs-contrib-cvss-scanni
             new_categories.append(category)
         
     if(len(new_categories)>0):
-        email_text+=f"\nThere were {len(new_categories)} new testing categories created in the last week, that will need new tests written for them. The new categories are:<br>\n"
-        email_text+="<b>"
+        email_parts.append(f"\nThere were {len(new_categories)} new testing categories created in the last week, that will need new tests written for them. The new categories are:<br>\n")
+        email_parts.append("<b>")
         for category in new_categories:
-            email_text+=f"{category}, "
-        email_text+="</b><br>"
+            email_parts.append(f"{category}, ")
+        email_parts.append("</b><br>")
         
 
-    #save email to file
-    file = open("email_body.html","w+")
-    file.write(email_text)
-    file.close()
+    #save email to file, via a temp file and rename so the send step never reads a partial body
+    with open("email_body.html.tmp", "w", encoding="utf-8") as file:
+        file.write("".join(email_parts))
+    os.replace("email_body.html.tmp", "email_body.html")
 main()
\ No newline at end of file
@@ -1,28 +1,12 @@
-import json
 import sys
-import sqlite3
 from datetime import datetime
 
-def get_category_history(category,db_path, limit=20 ):
-    try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        c.execute(
-            'SELECT run_at FROM category_history WHERE category = ? ORDER BY run_at ASC LIMIT ?',
-            (category, limit)
-        )
-        rows = c.fetchall()
-        conn.close()
-        return [row[0] for row in rows]
-    except Exception as e:
-        print(f'Warning: Could not get category history for {category}: {e}')
-        #return a greater cvss score than is possible so the email doesn't print the category as failing - we can't necessicarily know
-        return [11]
+from test_results_database_utils import get_category_runs, json_loads
 
 def parse_test_results(file_name):
     try:
-        with open(file_name, 'r') as f:
-            json_report = json.load(f)
+        with open(file_name, 'rb') as f:
+            json_report = json_loads(f.read())
     except FileNotFoundError:
         print("Error: report.json not found")
         sys.exit(1)
@@ -34,13 +18,6 @@ def parse_test_results(file_name):
         
         status = 'PASS' if test.get('outcome') == 'passed' else 'FAIL'
         
-        file_path = test_name.split('::')[0]
-        path_parts = file_path.split('/')
-        if len(path_parts) >= 2:
-            category = path_parts[-2]
-        else:
-            category = 'uncategorized'
-
         duration = test.get('call', {}).get('duration', 0)
         
         if duration == 0 or duration is None:
@@ -80,8 +57,9 @@ def main():
     resultString = ""
 
     new_categories=[]
+    category_runs = get_category_runs(data[0], sys.argv[2], 2, newest=False)
     for category in data[0]:
-        category_history = get_category_history(category,sys.argv[2],2)
+        category_history = [run_at for max_cvss, run_at in category_runs[category]]
         #since we are ordering by ascending, the oldest run_at is selected, and we can compare that to today's date to see if the tests are first ran within a day
         time = datetime.fromisoformat(category_history[0])
         today = datetime.today()
@@ -93,8 +71,7 @@ def main():
 
     if(len(new_categories)>0):
         resultString= f"Additionally, there are {len(new_categories)} new test categories, which will need new tests written for them:\n"
-        for category in new_categories:
-            resultString+=f"{category}, "
+        resultString+= "".join(f"{category}, " for category in new_categories)
 
     print(resultString)
 main()
\ No newline at end of file
@@ -1,95 +1,209 @@
+import atexit
 import os
 import sqlite3
+import threading
 
+from contextlib import contextmanager
 from datetime import datetime
 
+# shared with the report scripts: orjson parses report.json considerably faster,
+# the stdlib is the fallback when it isn't installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test_results.db')
 
+# WAL lets the dashboard read while results are being written, NORMAL sync
+# skips the per-commit fsync of the rollback journal
+_PRAGMAS = '''
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+'''
+
+# one connection is shared by every helper, so its page cache survives between calls;
+# callers in this process take turns on it
+_conn = None
+_conn_lock = threading.Lock()
+
+_SQL_INSERT_BASELINE_IF_MISSING = 'INSERT OR IGNORE INTO baselines (test_name, baseline_score, recorded_at) VALUES (?, ?, ?)'
+_SQL_INSERT_HISTORY = 'INSERT INTO history (test_name, cvss_score, status, run_at) VALUES (?, ?, ?, ?)'
+_SQL_INSERT_CATEGORY_HISTORY = 'INSERT INTO category_history (category, max_cvss, run_at) VALUES (?, ?, ?)'
+_SQL_SELECT_CATEGORY_HISTORY = 'SELECT max_cvss FROM category_history WHERE category = ? ORDER BY run_at DESC LIMIT ?'
+_SQL_SELECT_CATEGORY_BASELINE = 'SELECT max_cvss FROM category_history WHERE category = ? ORDER BY run_at ASC LIMIT 1'
+# latest (order DESC) or earliest (order ASC) `limit` runs of each requested
+# category, oldest first, each row carrying the category's first ever score as its baseline
+_SQL_SELECT_CATEGORY_RUNS = '''
+    SELECT category, max_cvss, run_at, baseline FROM (
+        SELECT category, max_cvss, run_at,
+               ROW_NUMBER() OVER (PARTITION BY category ORDER BY run_at {order}) AS rn,
+               FIRST_VALUE(max_cvss) OVER (PARTITION BY category ORDER BY run_at ASC) AS baseline
+        FROM category_history
+        WHERE category IN ({placeholders})
+    )
+    WHERE rn <= ?
+    ORDER BY category, run_at ASC
+'''
+
+def _get_conn():
+    # opened lazily on first use; call with _conn_lock held
+    global _conn
+    if _conn is None:
+        # transactions are opened explicitly with BEGIN where a write spans statements
+        # timeout is SQLite's busy timeout, so concurrent writers wait instead of failing with 'database is locked'
+        _conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False, timeout=60.0)
+        _conn.executescript(_PRAGMAS)
+    return _conn
+
+@atexit.register
+def _close_conn():
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+@contextmanager
+def _write_transaction():
+    with _conn_lock:
+        conn = _get_conn()
+        c = conn.cursor()
+        try:
+            c.execute('BEGIN IMMEDIATE')
+            yield c
+            c.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                c.execute('ROLLBACK')
+            raise
+
+@contextmanager
+def _read_cursor():
+    with _conn_lock:
+        yield _get_conn().cursor()
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS baselines (
-            test_name TEXT PRIMARY KEY,
-            baseline_score REAL NOT NULL,
-            recorded_at TEXT NOT NULL
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            test_name TEXT NOT NULL,
-            cvss_score REAL NOT NULL,
-            status TEXT NOT NULL,
-            run_at TEXT NOT NULL
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS category_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT NOT NULL,
-            max_cvss REAL NOT NULL,
-            run_at TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def save_test_result(test_name, cvss_score, status):
-    if cvss_score is None:
+    with _write_transaction() as c:
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS baselines (
+                test_name TEXT PRIMARY KEY,
+                baseline_score REAL NOT NULL,
+                recorded_at TEXT NOT NULL
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                test_name TEXT NOT NULL,
+                cvss_score REAL NOT NULL,
+                status TEXT NOT NULL,
+                run_at TEXT NOT NULL
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS category_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category TEXT NOT NULL,
+                max_cvss REAL NOT NULL,
+                run_at TEXT NOT NULL
+            )
+        ''')
+        # serves the latest-runs and first-run lookups per category
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_category_history_category_run
+            ON category_history (category, run_at)
+        ''')
+        c.execute('ANALYZE')
+
+def save_test_result(test_name, cvss_score, status, run_at=None):
+    save_test_results_bulk([(test_name, cvss_score, status)], run_at)
+
+def save_test_results_bulk(results, run_at=None):
+    # results is an iterable of (test_name, cvss_score, status) tuples
+    now = run_at or datetime.now().isoformat()
+    baseline_rows = []
+    history_rows = []
+    for test_name, cvss_score, status in results:
+        if cvss_score is None:
+            continue
+        baseline_rows.append((test_name, cvss_score, now))
+        history_rows.append((test_name, cvss_score, status, now))
+    if not history_rows:
         return
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    now = datetime.now().isoformat()
-    c.execute('SELECT baseline_score FROM baselines WHERE test_name = ?', (test_name,))
-    if c.fetchone() is None:
-        c.execute(
-            'INSERT INTO baselines (test_name, baseline_score, recorded_at) VALUES (?, ?, ?)',
-            (test_name, cvss_score, now)
-        )
-    c.execute(
-        'INSERT INTO history (test_name, cvss_score, status, run_at) VALUES (?, ?, ?, ?)',
-        (test_name, cvss_score, status, now)
-    )
-    conn.commit()
-    conn.close()
+    with _write_transaction() as c:
+        # the first score seen for a test becomes its baseline
+        c.executemany(_SQL_INSERT_BASELINE_IF_MISSING, baseline_rows)
+        c.executemany(_SQL_INSERT_HISTORY, history_rows)
+
+def save_category_max_cvss(category, max_cvss, run_at=None):
+    save_category_max_cvss_bulk([(category, max_cvss)], run_at)
 
-def save_category_max_cvss(category, max_cvss):
-    if max_cvss is None:
+def save_category_max_cvss_bulk(categories, run_at=None):
+    # categories is an iterable of (category, max_cvss) tuples
+    now = run_at or datetime.now().isoformat()
+    rows = [(category, max_cvss, now) for category, max_cvss in categories if max_cvss is not None]
+    if not rows:
         return
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    now = datetime.now().isoformat()
-    c.execute(
-        'INSERT INTO category_history (category, max_cvss, run_at) VALUES (?, ?, ?)',
-        (category, max_cvss, now)
-    )
-    conn.commit()
-    conn.close()
+    with _write_transaction() as c:
+        c.executemany(_SQL_INSERT_CATEGORY_HISTORY, rows)
 
 
 def get_category_history(category, limit=20):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute(
-            'SELECT max_cvss FROM category_history WHERE category = ? ORDER BY run_at DESC LIMIT ?',
-            (category, limit)
-        )
-        rows = c.fetchall()
-        conn.close()
+        with _read_cursor() as c:
+            c.execute(_SQL_SELECT_CATEGORY_HISTORY, (category, limit))
+            rows = c.fetchall()
         return [row[0] for row in reversed(rows)]
     except Exception as e:
         print(f'Warning: Could not get category history for {category}: {e}')
         return []
 
-def get_category_baseline(category):
+def _select_category_runs(c, categories, limit, newest):
+    order = 'DESC' if newest else 'ASC'
+    placeholders = ', '.join('?' * len(categories))
+    c.execute(_SQL_SELECT_CATEGORY_RUNS.format(order=order, placeholders=placeholders), (*categories, limit))
+    return c.fetchall()
+
+def get_category_trends(categories, limit=20):
+    # maps each category to (history, baseline), history oldest first
+    categories = list(categories)
+    histories = {category: [] for category in categories}
+    baselines = dict.fromkeys(categories)
+    if categories:
+        try:
+            with _read_cursor() as c:
+                rows = _select_category_runs(c, categories, limit, newest=True)
+            for category, max_cvss, run_at, baseline in rows:
+                histories[category].append(max_cvss)
+                baselines[category] = baseline
+        except Exception as e:
+            print(f'Warning: Could not get category trends: {e}')
+    return {category: (histories[category], baselines[category]) for category in categories}
+
+def get_category_runs(categories, db_path, limit=20, newest=True):
+    # for the report scripts, which read the database passed on their command line;
+    # maps each category to its (max_cvss, run_at) runs, oldest first, taking the
+    # latest `limit` runs when newest is set and the first `limit` otherwise
+    categories = list(categories)
+    runs = {category: [] for category in categories}
+    if not categories:
+        return runs
+    conn = sqlite3.connect(db_path)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('SELECT max_cvss FROM category_history WHERE category = ? ORDER BY run_at ASC LIMIT 1', (category,))
-        row = c.fetchone()
+        for category, max_cvss, run_at, baseline in _select_category_runs(conn.cursor(), categories, limit, newest):
+            runs[category].append((max_cvss, run_at))
+    finally:
         conn.close()
+    return runs
+
+def get_category_baseline(category):
+    try:
+        with _read_cursor() as c:
+            c.execute(_SQL_SELECT_CATEGORY_BASELINE, (category,))
+            row = c.fetchone()
         cat_baseline = row[0] if row else None
     except Exception as e:
         print(f'Warning: Could not get category baseline for {category}: {e}')
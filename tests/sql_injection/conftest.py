@@ -1,30 +1,32 @@
 
 import pytest_bdd
-from tests.utils import O3_LOGIN_URL,O3_HOME_URL, DEFAULT_WAIT_TIME
+from tests.utils import O3_LOGIN_URL,O3_HOME_URL, O3_WELCOME_URL, O3_API_URL, O3_PATIENT_URL
 from playwright.sync_api import Page
 import pytest
 
 @pytest_bdd.given("logged into OpenMRS O3")
 def login(page:Page):
+    # contexts start from the session's saved admin login, so only log in when that session is gone
+    if page.request.get(O3_API_URL).json().get("authenticated", False):
+        return
+
     page.goto(O3_LOGIN_URL)
     page.locator('#username').fill("admin")
     page.get_by_text("Continue").click()
     page.locator('#password').fill("Admin123")
     page.get_by_text("Log in").click()
 
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
+    page.wait_for_url(lambda url: url.startswith(O3_WELCOME_URL) or url.startswith(O3_HOME_URL))
 
     if(page.url.find("/openmrs/spa/login/location")!=-1):
         page.get_by_text("Outpatient Clinic").click()
         page.get_by_text("Remember my location").click()
         page.get_by_text("Confirm").click()
-        page.wait_for_timeout(DEFAULT_WAIT_TIME)
+        page.wait_for_url(lambda url: url.startswith(O3_HOME_URL))
 
 def createTestPatient(page:Page):
     page.goto(O3_HOME_URL)
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
     page.get_by_label('Add patient').click()
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
     page.locator('#givenName').fill("Test")
     page.locator('#familyName').fill("Patient")
     page.get_by_text("Other").click()
@@ -33,43 +35,57 @@ def createTestPatient(page:Page):
     page.locator("button").get_by_text('No').last.click()
     page.locator('#yearsEstimated').fill("26")
     page.locator('#monthsEstimated').fill("0")
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
     page.get_by_text("Register patient").click()
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
+    # registration opens the new patient's chart once the patient is saved
+    page.wait_for_url(lambda url: url.startswith(O3_PATIENT_URL) and "/chart" in url)
 
 @pytest_bdd.given('a test patient has been created')
 def verifyTestPatientExists(page:Page):
     page.goto(O3_HOME_URL)
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
     page.get_by_label('Search patient',exact=True).click()
-    page.get_by_placeholder('Search for a patient by name or identifier number').fill("Test Patient")
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
-    if(not page.get_by_text("Other").count()>=1):
+    # the search is debounced and fetched in the background, so read its result from the response
+    with page.expect_response(lambda response: "/ws/rest/v1/patient?" in response.url and "q=" in response.url) as search_response:
+        page.get_by_placeholder('Search for a patient by name or identifier number').fill("Test Patient")
+    if(not search_response.value.json().get("results")):
         createTestPatient(page)
-        page.wait_for_timeout(DEFAULT_WAIT_TIME)
 
 @pytest_bdd.given('the OpenMRS 3 edit patient page is displayed')
 def navigateToTestPatient(page:Page,url_data):
     page.goto(O3_HOME_URL)
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
+    # the header renders either the open search bar or its toggle button
+    search_bar = page.get_by_placeholder('Search for a patient by name or identifier number')
+    search_bar.or_(page.get_by_label('Search patient',exact=True)).first.wait_for()
     
     if(page.get_by_placeholder('Search for a patient by name or identifier number').count()<1):
         page.get_by_label('Search patient',exact=True).click()    
     page.get_by_placeholder('Search for a patient by name or identifier number').fill("Test Patient")
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
 
     page.get_by_role("button",name="Search").first.click()
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
     #find and click actions button
     child = page.get_by_text("Actions")
     child.click()
     #find and click actions button
-    page.wait_for_timeout(DEFAULT_WAIT_TIME/5)
     child = page.get_by_text("Edit patient details")
     child.click()
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
+    # the edit form is ready once its name fields render
+    page.locator('#givenName').wait_for()
     url_data["edit_url"]=page.url
 
 @pytest.fixture(scope="function")
 def url_data():
     return {}
+
+@pytest.fixture(scope="session")
+def admin_storage_state(browser):
+    # log in once per session and hand the cookies/local storage to every new context
+    context = browser.new_context()
+    page = context.new_page()
+    login(page)
+    storage_state = context.storage_state()
+    context.close()
+    return storage_state
+
+# settings for page from pytest-playwright plugin
+@pytest.fixture(scope="session")
+def browser_context_args(browser_context_args, admin_storage_state):
+    return {**browser_context_args, "storage_state": admin_storage_state}
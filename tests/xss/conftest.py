@@ -1,6 +1,6 @@
 import pytest
 import pytest_bdd
-from tests.utils import DEFAULT_WAIT_TIME, O3_LOGIN_URL, O3_HOME_URL,createTestPatient
+from tests.utils import O3_LOGIN_URL, O3_HOME_URL, O3_WELCOME_URL,createTestPatient
 from playwright.sync_api import Page
 
 @pytest.fixture(scope="function")
@@ -12,7 +12,7 @@ def cleanupTestPatient(page:Page,page_data):
     yield
     if page_data['editUrl']!=None:
         page.goto(page_data['editUrl'])
-        page.wait_for_timeout(DEFAULT_WAIT_TIME)
+        page.locator("#givenName").wait_for()
 
         page.locator("#givenName").fill("Test")
         page.locator("#middleName").fill("Ing")
@@ -37,46 +37,43 @@ def login(page:Page,page_data):
     page.locator('#password').fill("Admin123")
     page.get_by_text("Log in").click()
 
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
+    page.wait_for_url(lambda url: url.startswith(O3_WELCOME_URL) or url.startswith(O3_HOME_URL))
 
     if(page.url.find("/openmrs/spa/login/location")!=-1):
         page.get_by_text("Outpatient Clinic").click()
         page.get_by_text("Remember my location").click()
         page.get_by_text("Confirm").click()
-        page.wait_for_timeout(DEFAULT_WAIT_TIME)
+        page.wait_for_url(lambda url: url.startswith(O3_HOME_URL))
 
 @pytest_bdd.given('a test patient has been created')
 def verifyTestPatientExists(page:Page,page_data):
     page.goto(O3_HOME_URL)
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
     page.get_by_label('Search patient',exact=True).click()
-    page.get_by_placeholder('Search for a patient by name or identifier number').fill("Test Ing")
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
-    if(page.get_by_text("Other").count()>=1):
-        "hello"
-    else:
+    # the search is debounced and fetched in the background, so read its result from the response
+    with page.expect_response(lambda response: "/ws/rest/v1/patient?" in response.url and "q=" in response.url) as search_response:
+        page.get_by_placeholder('Search for a patient by name or identifier number').fill("Test Ing")
+    if(not search_response.value.json().get("results")):
         createTestPatient(page)
-        page.wait_for_timeout(DEFAULT_WAIT_TIME)
 
 @pytest_bdd.given('the OpenMRS 3 edit patient page is displayed')
 def navigateToTestPatient(page:Page,page_data):
     page.goto(O3_HOME_URL)
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
+    # the header renders either the open search bar or its toggle button
+    search_bar = page.get_by_placeholder('Search for a patient by name or identifier number')
+    search_bar.or_(page.get_by_label('Search patient',exact=True)).first.wait_for()
     
     if(page.get_by_placeholder('Search for a patient by name or identifier number').count()<1):
         page.get_by_label('Search patient',exact=True).click()    
     page.get_by_placeholder('Search for a patient by name or identifier number').fill("Test Ing")
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
 
     page.get_by_role("button",name="Search").first.click()
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
     #find and click actions button
     child = page.get_by_text("Actions")
     child.click()
     #find and click actions button
-    page.wait_for_timeout(DEFAULT_WAIT_TIME/5)
     child = page.get_by_text("Edit patient details")
     child.click()
-    page.wait_for_timeout(DEFAULT_WAIT_TIME)
+    # the edit form is ready once its name fields render
+    page.locator('#givenName').wait_for()
     page_data['editUrl']=page.url
 